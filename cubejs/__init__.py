@@ -1,6 +1,15 @@
 """CubeJS client package."""
 
-from cubejs.client import get_measures
+from cubejs.client import (
+    BatchingClient,
+    Client,
+    aclose,
+    clear_cache,
+    configure_cache,
+    get_measures,
+    get_measures_stream,
+    warmup,
+)
 from cubejs.errors import ContinueWaitError
 from cubejs.model import (
     CubeJSAuth,
@@ -16,6 +25,13 @@ from cubejs.model import (
 
 __all__ = [
     "get_measures",
+    "get_measures_stream",
+    "aclose",
+    "warmup",
+    "clear_cache",
+    "configure_cache",
+    "Client",
+    "BatchingClient",
     "ContinueWaitError",
     "CubeJSAuth",
     "CubeJSRequest",
@@ -0,0 +1,105 @@
+"""In-process cache for CubeJS responses."""
+
+import time
+from collections import OrderedDict
+from typing import Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+def _check_maxsize(maxsize: int) -> int:
+    """Check that a cache size isn't negative."""
+    if maxsize < 0:
+        raise ValueError(f"cache maxsize must not be negative, got {maxsize}")
+    return maxsize
+
+
+class TTLCache(Generic[K, V]):
+    """Least recently used cache where each entry expires after a time to live.
+
+    Args:
+        maxsize: maximum number of entries kept, the least recently used entry is
+            evicted when the cache is full.
+
+    Raises:
+        ValueError: if the size is negative.
+
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = _check_maxsize(maxsize)
+        self._entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: K) -> V | None:
+        """Get a value from the cache.
+
+        Args:
+            key: cache key.
+
+        Returns:
+            cached value, or None if the key is missing or expired.
+
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: K, value: V, ttl: float) -> None:
+        """Add a value to the cache.
+
+        Args:
+            key: cache key.
+            value: value to cache.
+            ttl: seconds until the entry expires, nothing is cached if it's not
+                positive.
+
+        """
+        if ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        self._evict()
+
+    def resize(self, maxsize: int) -> None:
+        """Change the maximum number of entries, evicting the least recently used.
+
+        Args:
+            maxsize: maximum number of entries kept.
+
+        Raises:
+            ValueError: if the size is negative.
+
+        """
+        self.maxsize = _check_maxsize(maxsize)
+        self._evict()
+
+    def _evict(self) -> None:
+        """Evict the least recently used entries until the cache fits its size.
+
+        Expired entries at the least recently used end are evicted too, so results
+        that are no longer read don't stay in memory until the cache is full.
+
+        """
+        entries = self._entries
+        while len(entries) > self.maxsize:
+            entries.popitem(last=False)
+        now = time.monotonic()
+        while entries:
+            expires_at, _ = next(iter(entries.values()))
+            if expires_at > now:
+                break
+            entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove all entries from the cache."""
+        self._entries.clear()
@@ -1,9 +1,20 @@
 """CubeJS client."""
 
+import asyncio
+import contextlib
+import email.utils
+import functools
+import json
+import os
+from datetime import datetime, timezone
+from typing import Any, AsyncGenerator, AsyncIterator, Callable
+
 import httpx
 import tenacity
 from loguru import logger
+from pydantic import BaseModel
 
+from cubejs.cache import TTLCache
 from cubejs.errors import (
     AuthorizationError,
     BadGatewayError,
@@ -13,7 +24,162 @@ from cubejs.errors import (
     ServerError,
     UnexpectedResponseError,
 )
-from cubejs.model import CubeJSAuth, CubeJSRequest, CubeJSResponse
+from cubejs.model import CubeJSAuth, CubeJSRequest, CubeJSResponse, Granularity
+
+_LOOP: asyncio.AbstractEventLoop | None = None
+_CLIENT: httpx.AsyncClient | None = None
+_CACHE: TTLCache[tuple[str, str, str], CubeJSResponse] = TTLCache(
+    maxsize=int(os.getenv("CUBEJS_CACHE_MAXSIZE", "10000"))
+)
+_INFLIGHT: dict[tuple[str, str, str], asyncio.Task[CubeJSResponse]] = {}
+_MAX_CONCURRENCY = int(os.getenv("CUBEJS_MAX_CONCURRENCY", "8"))
+_SEMAPHORE: asyncio.Semaphore | None = None
+_CONTINUE_WAIT = "Continue wait"
+_ERROR_KEY = b'"error"'
+_ERROR_PEEK_SIZE = 256
+
+
+def _bind_loop() -> None:
+    """Drop the shared client and semaphore made in another event loop.
+
+    Connections and semaphores are bound to the event loop they are first used in,
+    so each call to `asyncio.run` needs its own. Connections of a previous loop can't
+    be closed once the loop is closed, they are left to be garbage collected.
+
+    """
+    global _LOOP, _CLIENT, _SEMAPHORE
+    loop = asyncio.get_running_loop()
+    if _LOOP is not loop:
+        _LOOP, _CLIENT, _SEMAPHORE = loop, None, None
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    """Get the semaphore shared by module level calls, one per event loop."""
+    global _SEMAPHORE
+    _bind_loop()
+    if _SEMAPHORE is None:
+        _SEMAPHORE = asyncio.Semaphore(_MAX_CONCURRENCY)
+    return _SEMAPHORE
+
+
+def _get_client() -> httpx.AsyncClient:
+    """Get the shared http client, creating it on first use.
+
+    Reusing a single client keeps connections alive between calls, so only the first
+    request to a host pays for the TCP and TLS handshakes, and with HTTP/2 concurrent
+    requests share a single connection. Compressed responses are accepted with every
+    encoding httpx can decode, which includes brotli. A new client is created for
+    each event loop.
+
+    """
+    global _CLIENT
+    _bind_loop()
+    if _CLIENT is None or _CLIENT.is_closed:
+        _CLIENT = httpx.AsyncClient(
+            http2=True,
+            headers={"Accept": "application/json", "Content-Type": "application/json"},
+            timeout=httpx.Timeout(60.0, connect=5.0),
+            limits=httpx.Limits(max_keepalive_connections=100, max_connections=200),
+        )
+    return _CLIENT
+
+
+def clear_cache() -> None:
+    """Remove all cached responses."""
+    _CACHE.clear()
+
+
+def configure_cache(maxsize: int) -> None:
+    """Set how many responses are kept in the cache.
+
+    Cached responses are held in full, so memory grows with both the number and the
+    size of the cached results. The least recently used responses are evicted when
+    the cache is full, a size of 0 disables caching.
+
+    Args:
+        maxsize: maximum number of cached responses, `CUBEJS_CACHE_MAXSIZE` (10000)
+            by default.
+
+    Raises:
+        ValueError: if the size is negative.
+
+    """
+    _CACHE.resize(maxsize)
+
+
+async def aclose() -> None:
+    """Close the shared http client and its pooled connections.
+
+    Should be called on application shutdown. A new client is created if measures
+    are requested again afterwards.
+
+    """
+    global _CLIENT
+    if _CLIENT is not None and _LOOP is asyncio.get_running_loop():
+        await _CLIENT.aclose()
+    _CLIENT = None
+
+
+def _request_json(request: CubeJSRequest) -> str:
+    """Serialize a request with the field names and values expected by cubejs."""
+    return request.model_dump_json(by_alias=True, exclude_none=True)
+
+
+def _serialize(request_json: str) -> bytes:
+    """Build the load endpoint body for a serialized request."""
+    return b'{"query":' + request_json.encode() + b"}"
+
+
+def _retry_after(response: httpx.Response) -> float | None:
+    """Get the seconds to wait before retrying from the Retry-After header.
+
+    The header can either be a number of seconds or an HTTP date, dates without a
+    timezone are in UTC.
+
+    """
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def _has_error_key(head: bytes) -> bool:
+    """Check if the start of a response body has an error key."""
+    return _ERROR_KEY in head[:_ERROR_PEEK_SIZE]
+
+
+def _is_continue_wait(content: bytes) -> bool:
+    """Check if a successful response body is a "Continue wait" message.
+
+    The message comes with the stage the query is at, so its size varies. Only bodies
+    with an error key near their start are decoded.
+
+    """
+    if not _has_error_key(content):
+        return False
+    try:
+        body = json.loads(content)
+    except ValueError:
+        return False
+    return isinstance(body, dict) and body.get("error") == _CONTINUE_WAIT
+
+
+_STATUS_ERRORS: dict[int, Callable[[httpx.Response], Exception]] = {
+    400: lambda response: RequestError(response.text),
+    403: lambda response: AuthorizationError(response.text),
+    500: lambda response: ServerError(response.text),
+    502: lambda response: BadGatewayError(retry_after=_retry_after(response)),
+}
 
 
 def _error_handler(response: httpx.Response) -> None:
@@ -27,32 +193,197 @@ def _error_handler(response: httpx.Response) -> None:
 
     Anything other than 200 is unexpected and will raise an error.
 
+    Queries that are still running are answered with a 200 and a "Continue wait"
+    error body, only bodies starting with an error key are decoded to check for it,
+    so successful responses with data are never decoded here.
+
     """
-    if response.status_code == 403:
-        raise AuthorizationError(response.text)
-    if response.status_code == 400:
-        raise RequestError(response.text)
-    if "Continue wait" in response.text:
-        raise ContinueWaitError()
-    if response.status_code == 502:
-        raise BadGatewayError()
-    if response.status_code == 500:
-        raise ServerError(response.text)
-    if response.status_code != 200:
+    status_code = response.status_code
+    if status_code == 200:
+        if _is_continue_wait(response.content):
+            raise ContinueWaitError(retry_after=_retry_after(response))
+        return
+    error = _STATUS_ERRORS.get(status_code)
+    if error is None:
         raise UnexpectedResponseError(response.text)
+    raise error(response)
 
 
-@tenacity.retry(
-    retry=tenacity.retry_if_exception_type(RetryableError),
-    wait=tenacity.wait_exponential(multiplier=2, min=1, max=30),
-    stop=tenacity.stop_after_attempt(5),
-)
-async def get_measures(auth: CubeJSAuth, request: CubeJSRequest) -> CubeJSResponse:
+_MAX_WAIT = 30.0
+_backoff = tenacity.wait_random_exponential(
+    multiplier=1, max=_MAX_WAIT
+) + tenacity.wait_random(0, 1)
+
+
+def _wait(retry_state: tenacity.RetryCallState) -> float:
+    """Wait for as long as the server asked, or back off with random jitter.
+
+    Jitter keeps clients that failed together from retrying in lockstep.
+
+    """
+    exc = retry_state.outcome.exception() if retry_state.outcome else None
+    if isinstance(exc, RetryableError) and exc.retry_after is not None:
+        return min(exc.retry_after, _MAX_WAIT)
+    return float(_backoff(retry_state))
+
+
+def _retrying(max_attempts: int, max_retry_delay: float) -> tenacity.AsyncRetrying:
+    """Build the policy used to retry calls that failed with a retryable error.
+
+    Args:
+        max_attempts: maximum number of attempts.
+        max_retry_delay: seconds after which no more attempts are made.
+
+    """
+    return tenacity.AsyncRetrying(
+        retry=tenacity.retry_if_exception_type(RetryableError),
+        wait=_wait,
+        stop=(
+            tenacity.stop_after_attempt(max_attempts)
+            | tenacity.stop_after_delay(max_retry_delay)
+        ),
+    )
+
+
+_Retrying = Callable[[], tenacity.AsyncRetrying]
+_RETRYING: _Retrying = functools.partial(_retrying, max_attempts=5, max_retry_delay=120)
+
+
+async def _post(
+    auth: CubeJSAuth,
+    content: bytes,
+    semaphore: asyncio.Semaphore,
+    retrying: _Retrying,
+) -> httpx.Response:
+    """Post a body to the cubejs load endpoint and check the response for errors.
+
+    The semaphore bounds how many calls are waiting on the server at once, so bursts
+    queue up in the client instead of piling up in CubeJS and timing out. It's only
+    held while posting, not while waiting to retry.
+
+    """
+    client = _get_client()
+    async for attempt in retrying():
+        with attempt:
+            async with semaphore:
+                response = await client.post(
+                    url=auth.load_url, content=content, headers=auth.auth_headers
+                )
+            _error_handler(response)
+    return response
+
+
+class _RawResponse(BaseModel):
+    """CubeJS response with rows as parsed from json."""
+
+    data: list[dict[str, Any]]
+
+
+def _parse_response(content: bytes) -> CubeJSResponse:
+    """Parse a cubejs response body.
+
+    Rows only hold the scalar values cubejs returns, so they are kept as parsed from
+    json instead of validating every value against the row types, which is most of
+    the parsing time for large results.
+
+    """
+    data = _RawResponse.model_validate_json(content).data
+    return CubeJSResponse.model_construct(data=data)
+
+
+async def _load(
+    auth: CubeJSAuth,
+    request_json: str,
+    semaphore: asyncio.Semaphore,
+    retrying: _Retrying,
+) -> CubeJSResponse:
+    """Post a serialized request to the cubejs load endpoint."""
+    response = await _post(auth, _serialize(request_json), semaphore, retrying)
+    cube_js_response = _parse_response(response.content)
+    logger.debug("CubeJS response succesfully received!")
+    return cube_js_response
+
+
+async def _load_and_cache(
+    auth: CubeJSAuth,
+    request_json: str,
+    semaphore: asyncio.Semaphore,
+    retrying: _Retrying,
+    key: tuple[str, str, str],
+    ttl: float,
+) -> CubeJSResponse:
+    """Load a serialized request and cache the response."""
+    cube_js_response = await _load(auth, request_json, semaphore, retrying)
+    _CACHE.set(key, cube_js_response, ttl=ttl)
+    return cube_js_response
+
+
+def _forget_inflight(
+    key: tuple[str, str, str], task: asyncio.Task[CubeJSResponse]
+) -> None:
+    """Remove a finished request from the in-flight requests."""
+    if _INFLIGHT.get(key) is task:
+        del _INFLIGHT[key]
+    if not task.cancelled():
+        # mark the exception as retrieved in case every caller was cancelled
+        task.exception()
+
+
+async def _get_measures(
+    auth: CubeJSAuth,
+    request: CubeJSRequest,
+    semaphore: asyncio.Semaphore,
+    retrying: _Retrying,
+    cache_ttl: float,
+    bypass_cache: bool,
+) -> CubeJSResponse:
+    """Get measures from cubejs, see `get_measures`."""
+    logger.debug("Getting measures from {}", auth.host)
+    request_json = _request_json(request)
+    logger.debug("Query payload: {}", request_json)
+    if bypass_cache:
+        return await _load(auth, request_json, semaphore, retrying)
+
+    # the token is part of the key as it carries the security context of the query
+    key = (auth.host, auth.token, request_json)
+    cube_js_response = _CACHE.get(key)
+    if cube_js_response is not None:
+        logger.debug("CubeJS response served from cache!")
+        return cube_js_response
+
+    task = _INFLIGHT.get(key)
+    if task is None or task.get_loop() is not asyncio.get_running_loop():
+        task = asyncio.create_task(
+            _load_and_cache(auth, request_json, semaphore, retrying, key, cache_ttl)
+        )
+        task.add_done_callback(functools.partial(_forget_inflight, key))
+        _INFLIGHT[key] = task
+    else:
+        logger.debug("Waiting for an identical in-flight CubeJS request...")
+    # retries happen in the shared task, so coalesced callers don't multiply them
+    # shielded so a cancelled caller doesn't cancel the request for everyone else
+    return await asyncio.shield(task)
+
+
+async def get_measures(
+    auth: CubeJSAuth,
+    request: CubeJSRequest,
+    cache_ttl: float = 60.0,
+    bypass_cache: bool = False,
+) -> CubeJSResponse:
     """Get measures from cubejs.
 
+    Responses are cached in memory for `cache_ttl` seconds, identical requests made
+    with the same auth in that window are served from the cache without reaching
+    the server. Concurrent identical requests share a single call to the server.
+    Cached responses are shared between callers and should not be mutated.
+
     Args:
         auth: cubejs auth.
         request: definition of measures you want to fetch from the semantic layer.
+        cache_ttl: seconds a response is kept in the cache.
+        bypass_cache: if True, always fetch from the server and don't cache the
+            response.
 
     Returns:
         cubejs response with requested measures.
@@ -65,14 +396,460 @@ async def get_measures(auth: CubeJSAuth, request: CubeJSRequest) -> CubeJSRespon
         UnexpectedResponseError: if the response is unexpected.
 
     """
-    logger.debug(f"Getting measures from {auth.host}")
-    url = f"{auth.host}/cubejs-api/v1/load"
-    headers = {"Authorization": auth.token}
-    request_payload = {"query": request.model_dump(by_alias=True, exclude_none=True)}
-    logger.debug(f"Query payload: {request_payload}")
-    async with httpx.AsyncClient(timeout=60) as client:
-        response = await client.post(url=url, json=request_payload, headers=headers)
-        _error_handler(response)
-    cube_js_response = CubeJSResponse(**response.json())
-    logger.debug("CubeJS response succesfully received!")
-    return cube_js_response
+    return await _get_measures(
+        auth, request, _get_semaphore(), _RETRYING, cache_ttl, bypass_cache
+    )
+
+
+async def _ping(client: httpx.AsyncClient, url: str) -> None:
+    """Request an url, logging instead of raising connection errors."""
+    try:
+        await client.get(url)
+    except httpx.HTTPError as exc:
+        logger.warning("CubeJS warm up request failed: {}", exc)
+
+
+async def warmup(auth: CubeJSAuth, requests: int = 1) -> None:
+    """Connect to cubejs ahead of the first request.
+
+    Requests are sent concurrently to the readiness endpoint of the host, so DNS
+    resolution and the TCP and TLS handshakes are done before measures are
+    requested. HTTP/2 hosts multiplex every request over a single connection, only
+    HTTP/1.1 hosts open a connection per concurrent request. Failures are only
+    logged, as requesting measures will connect again anyway.
+
+    Args:
+        auth: cubejs auth.
+        requests: number of concurrent requests sent.
+
+    """
+    logger.debug("Warming up the connection to {}", auth.host)
+    client = _get_client()
+    url = f"{auth.host}/readyz"
+    await asyncio.gather(*(_ping(client, url) for _ in range(requests)))
+
+
+class _StreamReader:
+    """File-like reader over the chunks of a streamed response body.
+
+    What has been read is kept in `body` until it's set to None, so a response
+    without rows can still be checked once it's over.
+
+    """
+
+    def __init__(self, head: bytes, chunks: AsyncIterator[bytes]) -> None:
+        self._head = head
+        self._chunks = chunks
+        self.body: bytearray | None = bytearray()
+
+    async def read(self, size: int = -1) -> bytes:
+        """Read the next chunk of the body, an empty chunk means it's over."""
+        if size == 0:
+            return b""
+        if self._head:
+            chunk, self._head = self._head, b""
+        else:
+            chunk = await anext(self._chunks, b"")
+        if self.body is not None:
+            self.body += chunk
+        return chunk
+
+
+async def _send_stream(
+    auth: CubeJSAuth, content: bytes, semaphore: asyncio.Semaphore
+) -> tuple[httpx.Response, _StreamReader]:
+    """Post a body to the cubejs load endpoint and stream the response.
+
+    Only the start of the body is read to check it for errors, the rest is left to be
+    streamed by the caller, who is responsible for closing the response. Bodies with
+    an error key are read in full to check if the query is still running.
+
+    """
+    client = _get_client()
+    request = client.build_request(
+        "POST", url=auth.load_url, content=content, headers=auth.auth_headers
+    )
+    async with semaphore:
+        response = await client.send(request, stream=True)
+    try:
+        if response.status_code != 200:
+            await response.aread()
+            _error_handler(response)
+        chunks = response.aiter_bytes()
+        head = b""
+        async for chunk in chunks:
+            head += chunk
+            if len(head) >= _ERROR_PEEK_SIZE:
+                break
+        if _has_error_key(head):
+            async for chunk in chunks:
+                head += chunk
+            if _is_continue_wait(head):
+                raise ContinueWaitError(retry_after=_retry_after(response))
+    except BaseException:
+        await response.aclose()
+        raise
+    return response, _StreamReader(head, chunks)
+
+
+def _check_stream_data(body: bytes | bytearray) -> None:
+    """Check that a streamed response without rows has data.
+
+    Raises:
+        UnexpectedResponseError: if the response has no data.
+
+    """
+    try:
+        data = json.loads(body)
+    except ValueError:
+        data = None
+    if not isinstance(data, dict) or "data" not in data:
+        raise UnexpectedResponseError(body.decode(errors="replace"))
+
+
+async def _open_stream(
+    auth: CubeJSAuth,
+    content: bytes,
+    semaphore: asyncio.Semaphore,
+    retrying: _Retrying,
+) -> tuple[httpx.Response, _StreamReader]:
+    """Open a streamed response, retrying until it's ready, see `_send_stream`."""
+    async for attempt in retrying():
+        with attempt:
+            stream = await _send_stream(auth, content, semaphore)
+    return stream
+
+
+async def _get_measures_stream(
+    auth: CubeJSAuth,
+    request: CubeJSRequest,
+    semaphore: asyncio.Semaphore,
+    retrying: _Retrying,
+) -> AsyncGenerator[dict[str, Any], None]:
+    """Stream rows of measures from cubejs, see `get_measures_stream`."""
+    try:
+        import ijson
+    except ImportError as exc:
+        raise ImportError(
+            "streaming measures requires ijson, install it with cubejs[stream]"
+        ) from exc
+
+    logger.debug("Streaming measures from {}", auth.host)
+    request_json = _request_json(request)
+    logger.debug("Query payload: {}", request_json)
+    response, reader = await _open_stream(
+        auth, _serialize(request_json), semaphore, retrying
+    )
+    try:
+        async for row in ijson.items_async(reader, "data.item", use_float=True):
+            reader.body = None
+            yield row
+        if reader.body is not None:
+            _check_stream_data(reader.body)
+    finally:
+        await response.aclose()
+
+
+async def get_measures_stream(
+    auth: CubeJSAuth, request: CubeJSRequest
+) -> AsyncIterator[dict[str, Any]]:
+    """Stream rows of measures from cubejs as they are downloaded.
+
+    Rows are parsed while the response is still being downloaded, so large results
+    are never held in memory at once. Responses aren't cached nor validated. Requires
+    the optional ijson dependency, installed with the `stream` extra.
+
+    Args:
+        auth: cubejs auth.
+        request: definition of measures you want to fetch from the semantic layer.
+
+    Yields:
+        rows of the cubejs response data.
+
+    Raises:
+        AuthorizationError: if the request is not authorized.
+        RequestError: if the request is invalid.
+        ContinueWaitError: if the request is not ready yet.
+        ServerError: if the server is not available.
+        UnexpectedResponseError: if the response is unexpected.
+
+    """
+    # closing the rows closes the response when the caller stops early
+    rows = _get_measures_stream(auth, request, _get_semaphore(), _RETRYING)
+    async with contextlib.aclosing(rows):
+        async for row in rows:
+            yield row
+
+
+class Client:
+    """CubeJS client bound to a host.
+
+    Calls made through `get_measures` share a concurrency limit of
+    `CUBEJS_MAX_CONCURRENCY` (8 by default) across all hosts, a client keeps its own
+    limit so it can be tuned per host.
+
+    Args:
+        auth: cubejs auth.
+        max_concurrency: maximum number of concurrent calls to the server.
+        max_attempts: maximum number of attempts for a call that can be retried.
+        max_retry_delay: seconds after which a call is no longer retried.
+
+    """
+
+    def __init__(
+        self,
+        auth: CubeJSAuth,
+        max_concurrency: int = _MAX_CONCURRENCY,
+        max_attempts: int = 5,
+        max_retry_delay: float = 120.0,
+    ) -> None:
+        self.auth = auth
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._retrying: _Retrying = functools.partial(
+            _retrying, max_attempts, max_retry_delay
+        )
+
+    async def get_measures(
+        self,
+        request: CubeJSRequest,
+        cache_ttl: float = 60.0,
+        bypass_cache: bool = False,
+    ) -> CubeJSResponse:
+        """Get measures from cubejs, see `cubejs.get_measures` for details.
+
+        Args:
+            request: definition of measures you want to fetch from the semantic
+                layer.
+            cache_ttl: seconds a response is kept in the cache.
+            bypass_cache: if True, always fetch from the server and don't cache the
+                response.
+
+        Returns:
+            cubejs response with requested measures.
+
+        """
+        return await _get_measures(
+            self.auth, request, self._semaphore, self._retrying, cache_ttl, bypass_cache
+        )
+
+    async def warmup(self, requests: int = 1) -> None:
+        """Connect to cubejs ahead of the first request, see `cubejs.warmup`.
+
+        Args:
+            requests: number of concurrent requests sent.
+
+        """
+        await warmup(self.auth, requests)
+
+    async def get_measures_stream(
+        self, request: CubeJSRequest
+    ) -> AsyncIterator[dict[str, Any]]:
+        """Stream rows of measures from cubejs, see `cubejs.get_measures_stream`.
+
+        Args:
+            request: definition of measures you want to fetch from the semantic
+                layer.
+
+        Yields:
+            rows of the cubejs response data.
+
+        """
+        rows = _get_measures_stream(self.auth, request, self._semaphore, self._retrying)
+        async with contextlib.aclosing(rows):
+            async for row in rows:
+                yield row
+
+
+class _BatchResponse(BaseModel):
+    """CubeJS response to many queries sent in a single call."""
+
+    results: list[_RawResponse]
+
+
+async def _load_many(
+    auth: CubeJSAuth,
+    request_jsons: list[str],
+    semaphore: asyncio.Semaphore,
+    retrying: _Retrying,
+) -> list[CubeJSResponse]:
+    """Post many serialized requests to the cubejs load endpoint in a single call."""
+    content = b'{"query":[' + ",".join(request_jsons).encode() + b"]}"
+    response = await _post(auth, content, semaphore, retrying)
+    results = _BatchResponse.model_validate_json(response.content).results
+    if len(results) != len(request_jsons):
+        raise UnexpectedResponseError(
+            f"expected {len(request_jsons)} results, got {len(results)}"
+        )
+    logger.debug("CubeJS batch of {} responses succesfully received!", len(results))
+    return [CubeJSResponse.model_construct(data=result.data) for result in results]
+
+
+def _batch_key(request: CubeJSRequest) -> Granularity | None:
+    """Get the key used to group a request in a batch.
+
+    CubeJS answers many queries in a single call as a data blending query, which
+    requires every query to share the granularity of its first time dimension.
+    Queries that compare date ranges expand to many results and can't be batched.
+
+    Returns:
+        granularity of the request, or None if the request can't be batched.
+
+    """
+    if not request.time_dimensions:
+        return None
+    time_dimension = request.time_dimensions[0]
+    if time_dimension.compare_date_range is not None:
+        return None
+    return time_dimension.granularity
+
+
+_BatchItem = tuple[str, "asyncio.Future[CubeJSResponse]"]
+# errors a single query in a batch can cause, unlike auth or retries running out
+_QUERY_ERRORS = (RequestError, ServerError, UnexpectedResponseError)
+
+
+class BatchingClient:
+    """Client that batches concurrent requests into a single call to CubeJS.
+
+    Requests are queued and sent together once `max_batch` requests are waiting or
+    `max_delay_ms` milliseconds have passed since the first one was queued, so
+    concurrent requests share a single round trip. Only requests with the same
+    granularity in their first time dimension are batched together, anything else is
+    sent on its own. When a batch fails because of its queries, each request is sent
+    again on its own, so an invalid query only fails its own call.
+
+    Args:
+        auth: cubejs auth.
+        max_batch: maximum number of requests sent in a single call.
+        max_delay_ms: maximum time in milliseconds a request waits for a batch.
+        max_concurrency: maximum number of concurrent calls to the server.
+        max_attempts: maximum number of attempts for a call that can be retried.
+        max_retry_delay: seconds after which a call is no longer retried.
+
+    """
+
+    def __init__(
+        self,
+        auth: CubeJSAuth,
+        max_batch: int = 32,
+        max_delay_ms: float = 5.0,
+        max_concurrency: int = _MAX_CONCURRENCY,
+        max_attempts: int = 5,
+        max_retry_delay: float = 120.0,
+    ) -> None:
+        self.auth = auth
+        self.max_batch = max_batch
+        self.max_delay_ms = max_delay_ms
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._retrying: _Retrying = functools.partial(
+            _retrying, max_attempts, max_retry_delay
+        )
+        self._queue: asyncio.Queue[tuple[Granularity, _BatchItem]] | None = None
+        self._flusher: asyncio.Task[None] | None = None
+        self._batches: set[asyncio.Task[None]] = set()
+
+    async def get_measures(self, request: CubeJSRequest) -> CubeJSResponse:
+        """Get measures from cubejs.
+
+        Args:
+            request: definition of measures you want to fetch from the semantic
+                layer.
+
+        Returns:
+            cubejs response with requested measures.
+
+        """
+        request_json = _request_json(request)
+        key = _batch_key(request)
+        if key is None:
+            return await _load(self.auth, request_json, self._semaphore, self._retrying)
+
+        if self._queue is None or self._flusher is None or self._flusher.done():
+            self._queue = asyncio.Queue()
+            self._flusher = asyncio.create_task(self._flush(self._queue))
+        future: asyncio.Future[CubeJSResponse]
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((key, (request_json, future)))
+        return await future
+
+    async def aclose(self) -> None:
+        """Stop batching and cancel queued and in-flight requests."""
+        tasks = list(self._batches)
+        if self._flusher is not None:
+            tasks.append(self._flusher)
+            self._flusher = None
+        if self._queue is not None:
+            while not self._queue.empty():
+                _, (_, future) = self._queue.get_nowait()
+                future.cancel()
+            self._queue = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _flush(
+        self, queue: asyncio.Queue[tuple[Granularity, _BatchItem]]
+    ) -> None:
+        """Collect queued requests into batches and send them."""
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await queue.get()]
+            deadline = loop.time() + self.max_delay_ms / 1000
+            try:
+                while len(pending) < self.max_batch:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        pending.append(await asyncio.wait_for(queue.get(), timeout))
+                    except TimeoutError:
+                        break
+            except BaseException:
+                # requests taken off the queue are lost if batching stops
+                for _, (_, future) in pending:
+                    future.cancel()
+                raise
+
+            batches: dict[Granularity, list[_BatchItem]] = {}
+            for key, item in pending:
+                batches.setdefault(key, []).append(item)
+            for items in batches.values():
+                batch = asyncio.create_task(self._send(items))
+                self._batches.add(batch)
+                batch.add_done_callback(self._batches.discard)
+
+    async def _send(self, items: list[_BatchItem]) -> None:
+        """Send a batch of requests and resolve their futures.
+
+        If a batch fails with an error a single query can cause, each request is sent
+        again on its own so the error is only raised to the caller that caused it.
+
+        """
+        request_jsons = [request_json for request_json, _ in items]
+        try:
+            if len(items) == 1:
+                response = await _load(
+                    self.auth, request_jsons[0], self._semaphore, self._retrying
+                )
+                responses = [response]
+            else:
+                responses = await _load_many(
+                    self.auth, request_jsons, self._semaphore, self._retrying
+                )
+        except Exception as exc:
+            if len(items) > 1 and isinstance(exc, _QUERY_ERRORS):
+                await asyncio.gather(*(self._send([item]) for item in items))
+                return
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        except BaseException:
+            for _, future in items:
+                future.cancel()
+            raise
+        for (_, future), response in zip(items, responses):
+            if not future.done():
+                future.set_result(response)
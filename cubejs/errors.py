@@ -42,7 +42,15 @@ class UnexpectedResponseError(Exception):
 
 
 class RetryableError(Exception):
-    """Raised when a retry can be performed."""
+    """Raised when a retry can be performed.
+
+    Args:
+        retry_after: seconds the server asked to wait before retrying, if any.
+
+    """
+
+    def __init__(self, retry_after: float | None = None) -> None:
+        self.retry_after = retry_after
 
     def __str__(self) -> str:
         return "CubeJS failed but we can attempt a retry"
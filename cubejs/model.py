@@ -2,7 +2,7 @@
 
 from enum import Enum
 
-from pydantic import BaseModel, Field, model_validator
+from pydantic import BaseModel, ConfigDict, Field, model_validator
 
 
 class OrderBy(str, Enum):
@@ -104,6 +104,8 @@ class TimeDimension(BaseModel):
             different time periods.
     """
 
+    model_config = ConfigDict(populate_by_name=True, extra="forbid", frozen=True)
+
     dimension: str
     granularity: Granularity | None = None
     date_range: list[str] | str | None = Field(
@@ -129,10 +131,6 @@ class TimeDimension(BaseModel):
 
         return self
 
-    class Config:  # noqa: D106
-        exclude_none = True
-        populate_by_name = True
-
 
 class Filter(BaseModel):
     """Filter section of a cubejs request.
@@ -151,6 +149,8 @@ class Filter(BaseModel):
             like 'set' and 'notSet'.
     """
 
+    model_config = ConfigDict(extra="forbid", frozen=True)
+
     member: str
     operator: str
     values: list[str] | None = None
@@ -172,15 +172,13 @@ class LogicalOperator(BaseModel):
         and_: List of filters or other logical operators to combine with AND.
     """
 
+    model_config = ConfigDict(populate_by_name=True, extra="forbid", frozen=True)
+
     or_: list["FilterOrLogical"] | None = Field(default=None, serialization_alias="or")
     and_: list["FilterOrLogical"] | None = Field(
         default=None, serialization_alias="and"
     )
 
-    class Config:  # noqa: D106
-        exclude_none = True
-        populate_by_name = True
-
 
 FilterOrLogical = Filter | LogicalOperator
 
@@ -211,19 +209,47 @@ class CubeJSRequest(BaseModel):
     limit: int | None = None
     offset: int | None = None
 
+    @model_validator(mode="after")
+    def validate_not_empty(self) -> "CubeJSRequest":
+        """Validate that the request asks for something, as CubeJS would reject it."""
+        if self.measures or self.dimensions:
+            return self
+        if any(td.granularity for td in self.time_dimensions or []):
+            return self
+        raise ValueError(
+            "Query should contain either measures, dimensions or time dimensions "
+            "with granularities in order to be valid"
+        )
+
 
 class CubeJSAuth(BaseModel):
     """CubeJS auth configuration.
 
+    Immutable, as responses are cached by token: a token changed while a request is
+    in flight would cache the response under another token. Use `model_copy` to
+    rotate a token.
+
     Args:
         token: cubejs token.
         host: cubejs cloud host.
 
     """
 
+    model_config = ConfigDict(frozen=True)
+
     token: str
     host: str
 
+    @property
+    def load_url(self) -> str:
+        """Url of the cubejs load endpoint."""
+        return f"{self.host}/cubejs-api/v1/load"
+
+    @property
+    def auth_headers(self) -> dict[str, str]:
+        """Headers authorizing requests to cubejs."""
+        return {"Authorization": self.token}
+
 
 class CubeJSResponse(BaseModel):
     """CubeJS response.
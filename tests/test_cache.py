@@ -0,0 +1,108 @@
+import time
+
+import pytest
+
+from cubejs.cache import TTLCache
+
+
+def test_get_and_set():
+    # arrange
+    cache = TTLCache(maxsize=2)
+
+    # act
+    cache.set("key", "value", ttl=60)
+
+    # assert
+    assert cache.get("key") == "value"
+    assert cache.get("missing") is None
+
+
+def test_expired_entry():
+    # arrange
+    cache = TTLCache(maxsize=2)
+
+    # act
+    cache.set("key", "value", ttl=0)
+
+    # assert
+    assert cache.get("key") is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_is_evicted():
+    # arrange
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1, ttl=60)
+    cache.set("b", 2, ttl=60)
+
+    # act
+    cache.get("a")
+    cache.set("c", 3, ttl=60)
+
+    # assert
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_clear():
+    # arrange
+    cache = TTLCache(maxsize=2)
+    cache.set("key", "value", ttl=60)
+
+    # act
+    cache.clear()
+
+    # assert
+    assert len(cache) == 0
+
+
+def test_resize():
+    # arrange
+    cache = TTLCache(maxsize=3)
+    cache.set("a", 1, ttl=60)
+    cache.set("b", 2, ttl=60)
+    cache.set("c", 3, ttl=60)
+
+    # act
+    cache.resize(1)
+
+    # assert
+    assert len(cache) == 1
+    assert cache.get("c") == 3
+
+
+def test_set_without_ttl_keeps_entries():
+    # arrange
+    cache = TTLCache(maxsize=1)
+    cache.set("a", 1, ttl=60)
+
+    # act
+    cache.set("b", 2, ttl=0)
+
+    # assert
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+
+
+def test_expired_entries_are_evicted():
+    # arrange
+    cache = TTLCache(maxsize=10)
+    cache.set("a", 1, ttl=0.01)
+    cache.set("b", 2, ttl=0.01)
+    time.sleep(0.02)
+
+    # act
+    cache.set("c", 3, ttl=60)
+
+    # assert
+    assert len(cache) == 1
+
+
+def test_negative_maxsize():
+    # act
+    with pytest.raises(ValueError):
+        TTLCache(maxsize=-1)
+
+    with pytest.raises(ValueError):
+        TTLCache(maxsize=1).resize(-1)
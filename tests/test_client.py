@@ -1,8 +1,20 @@
+import asyncio
+import email.utils
+import http.server
+import json
+import threading
+from datetime import datetime, timedelta, timezone
 from unittest.mock import Mock
 
+import httpx
 import pytest
+import pytest_asyncio
+import tenacity
+from pytest_httpx import IteratorStream
 
 from cubejs import (
+    BatchingClient,
+    Client,
     CubeJSAuth,
     CubeJSRequest,
     CubeJSResponse,
@@ -10,10 +22,38 @@ from cubejs import (
     TimeDimension,
     errors,
     get_measures,
+    get_measures_stream,
+    warmup,
+)
+from cubejs.client import (
+    _error_handler,
+    _get_client,
+    _parse_response,
+    _serialize,
+    _wait,
+    aclose,
+    clear_cache,
+    configure_cache,
 )
-from cubejs.client import _error_handler
 from cubejs.model import FilterOperators, Granularity, OrderBy
 
+CONTINUE_WAIT_WITH_STAGE = {
+    "error": "Continue wait",
+    "stage": {"stage": "Executing query", "timeElapsed": 1234},
+}
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def shared_client():
+    yield
+    await aclose()
+
+
+@pytest.fixture(autouse=True)
+def response_cache():
+    yield
+    clear_cache()
+
 
 @pytest.mark.asyncio
 async def test_get_metrics(httpx_mock):
@@ -88,6 +128,781 @@ async def test_get_metrics(httpx_mock):
     )
 
 
+@pytest.mark.asyncio
+async def test_get_measures_payload(httpx_mock):
+    # arrange
+    httpx_mock.add_response(
+        method="POST", url="https://host/cubejs-api/v1/load", json={"data": []}
+    )
+
+    # act
+    await get_measures(
+        auth=CubeJSAuth(token="token", host="https://host"),
+        request=CubeJSRequest(
+            measures=["orders.count"],
+            time_dimensions=[
+                TimeDimension(
+                    dimension="orders.created_at",
+                    granularity=Granularity.DAY,
+                    date_range="last 30 days",
+                )
+            ],
+            order={"orders.count": OrderBy.DESC},
+        ),
+    )
+
+    # assert
+    request = httpx_mock.get_request()
+    assert request.headers["Authorization"] == "token"
+    assert request.headers["Content-Type"] == "application/json"
+    assert request.headers["Accept"] == "application/json"
+    assert {"gzip", "br"} <= set(request.headers["Accept-Encoding"].split(", "))
+    assert json.loads(request.content) == {
+        "query": {
+            "measures": ["orders.count"],
+            "timeDimensions": [
+                {
+                    "dimension": "orders.created_at",
+                    "granularity": "day",
+                    "dateRange": "last 30 days",
+                }
+            ],
+            "filters": [],
+            "order": {"orders.count": "desc"},
+        }
+    }
+
+
+@pytest.mark.asyncio
+async def test_get_measures_cache(httpx_mock):
+    # arrange
+    httpx_mock.add_response(
+        method="POST",
+        url="https://host/cubejs-api/v1/load",
+        json={"data": [{"orders.count": 42}]},
+    )
+    auth = CubeJSAuth(token="token", host="https://host")
+    request = CubeJSRequest(measures=["orders.count"])
+
+    # act
+    first = await get_measures(auth=auth, request=request)
+    second = await get_measures(auth=auth, request=request)
+
+    # assert
+    assert first == second == CubeJSResponse(data=[{"orders.count": 42}])
+    assert len(httpx_mock.get_requests()) == 1
+
+
+@pytest.mark.asyncio
+async def test_get_measures_cache_is_scoped_by_token(httpx_mock):
+    # arrange
+    httpx_mock.add_response(
+        method="POST",
+        url="https://host/cubejs-api/v1/load",
+        json={"data": [{"orders.count": 42}]},
+    )
+    httpx_mock.add_response(
+        method="POST",
+        url="https://host/cubejs-api/v1/load",
+        json={"data": [{"orders.count": 13}]},
+    )
+    request = CubeJSRequest(measures=["orders.count"])
+
+    # act
+    first = await get_measures(
+        auth=CubeJSAuth(token="token", host="https://host"), request=request
+    )
+    second = await get_measures(
+        auth=CubeJSAuth(token="other-token", host="https://host"), request=request
+    )
+
+    # assert
+    assert first.data == [{"orders.count": 42}]
+    assert second.data == [{"orders.count": 13}]
+
+
+@pytest.mark.asyncio
+async def test_get_measures_bypass_cache(httpx_mock):
+    # arrange
+    httpx_mock.add_response(
+        method="POST",
+        url="https://host/cubejs-api/v1/load",
+        json={"data": [{"orders.count": 42}]},
+        is_reusable=True,
+    )
+    auth = CubeJSAuth(token="token", host="https://host")
+    request = CubeJSRequest(measures=["orders.count"])
+
+    # act
+    await get_measures(auth=auth, request=request, cache_ttl=0)
+    await get_measures(auth=auth, request=request)
+    await get_measures(auth=auth, request=request, bypass_cache=True)
+    await get_measures(auth=auth, request=request)
+
+    # assert
+    assert len(httpx_mock.get_requests()) == 3
+
+
+@pytest.mark.asyncio
+async def test_configure_cache(httpx_mock):
+    # arrange
+    httpx_mock.add_response(
+        method="POST",
+        url="https://host/cubejs-api/v1/load",
+        json={"data": [{"orders.count": 42}]},
+        is_reusable=True,
+    )
+    auth = CubeJSAuth(token="token", host="https://host")
+    request = CubeJSRequest(measures=["orders.count"])
+    configure_cache(maxsize=0)
+
+    # act
+    try:
+        await get_measures(auth=auth, request=request)
+        await get_measures(auth=auth, request=request)
+    finally:
+        configure_cache(maxsize=10_000)
+
+    # assert
+    assert len(httpx_mock.get_requests()) == 2
+
+
+@pytest.mark.asyncio
+async def test_get_measures_coalesces_concurrent_requests(httpx_mock):
+    # arrange
+    httpx_mock.add_response(
+        method="POST",
+        url="https://host/cubejs-api/v1/load",
+        json={"data": [{"orders.count": 42}]},
+    )
+    auth = CubeJSAuth(token="token", host="https://host")
+    request = CubeJSRequest(measures=["orders.count"])
+
+    # act
+    responses = await asyncio.gather(
+        *(get_measures(auth=auth, request=request) for _ in range(5))
+    )
+
+    # assert
+    assert all(r == CubeJSResponse(data=[{"orders.count": 42}]) for r in responses)
+    assert len(httpx_mock.get_requests()) == 1
+
+
+@pytest.mark.asyncio
+async def test_get_measures_coalesced_error(httpx_mock):
+    # arrange
+    httpx_mock.add_response(
+        method="POST",
+        url="https://host/cubejs-api/v1/load",
+        status_code=400,
+        text="invalid query",
+    )
+    auth = CubeJSAuth(token="token", host="https://host")
+    request = CubeJSRequest(measures=["orders.count"])
+
+    # act
+    results = await asyncio.gather(
+        *(get_measures(auth=auth, request=request) for _ in range(3)),
+        return_exceptions=True,
+    )
+
+    # assert
+    assert all(isinstance(r, errors.RequestError) for r in results)
+    assert len(httpx_mock.get_requests()) == 1
+
+
+@pytest.mark.asyncio
+async def test_client_max_concurrency(httpx_mock):
+    # arrange
+    running = 0
+    max_running = 0
+
+    async def load(request):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return httpx.Response(status_code=200, json={"data": []})
+
+    httpx_mock.add_callback(
+        load, method="POST", url="https://host/cubejs-api/v1/load", is_reusable=True
+    )
+    client = Client(
+        auth=CubeJSAuth(token="token", host="https://host"), max_concurrency=2
+    )
+
+    # act
+    await asyncio.gather(
+        *(
+            client.get_measures(CubeJSRequest(measures=[f"orders.count_{i}"]))
+            for i in range(6)
+        )
+    )
+
+    # assert
+    assert len(httpx_mock.get_requests()) == 6
+    assert max_running == 2
+
+
+@pytest.mark.asyncio
+async def test_get_measures_stream(httpx_mock):
+    # arrange
+    rows = [{"orders.status": f"status_{i}", "orders.count": i} for i in range(100)]
+    httpx_mock.add_response(
+        method="POST",
+        url="https://host/cubejs-api/v1/load",
+        status_code=200,
+        content=b'{"error":"Continue wait"}',
+        headers={"Retry-After": "0"},
+    )
+    body = json.dumps({"query": {"measures": ["orders.count"]}, "data": rows})
+    httpx_mock.add_response(
+        method="POST",
+        url="https://host/cubejs-api/v1/load",
+        stream=IteratorStream(
+            [body[i : i + 10].encode() for i in range(0, len(body), 10)]
+        ),
+    )
+
+    # act
+    output = [
+        row
+        async for row in get_measures_stream(
+            auth=CubeJSAuth(token="token", host="https://host"),
+            request=CubeJSRequest(
+                measures=["orders.count"], dimensions=["orders.status"]
+            ),
+        )
+    ]
+
+    # assert
+    assert output == rows
+    assert len(httpx_mock.get_requests()) == 2
+
+
+@pytest.mark.asyncio
+async def test_get_measures_stream_continue_wait_with_stage(httpx_mock):
+    # arrange
+    body = json.dumps(CONTINUE_WAIT_WITH_STAGE).encode()
+    httpx_mock.add_response(
+        method="POST",
+        url="https://host/cubejs-api/v1/load",
+        stream=IteratorStream([body[i : i + 10] for i in range(0, len(body), 10)]),
+        headers={"Retry-After": "0"},
+    )
+    httpx_mock.add_response(
+        method="POST",
+        url="https://host/cubejs-api/v1/load",
+        json={"data": [{"orders.count": 42}]},
+    )
+
+    # act
+    output = [
+        row
+        async for row in get_measures_stream(
+            auth=CubeJSAuth(token="token", host="https://host"),
+            request=CubeJSRequest(measures=["orders.count"]),
+        )
+    ]
+
+    # assert
+    assert output == [{"orders.count": 42}]
+    assert len(httpx_mock.get_requests()) == 2
+
+
+@pytest.mark.asyncio
+async def test_get_measures_stream_without_data(httpx_mock):
+    # arrange
+    httpx_mock.add_response(
+        method="POST",
+        url="https://host/cubejs-api/v1/load",
+        json={"query": {"measures": ["orders.count"]}},
+    )
+
+    # act
+    with pytest.raises(errors.UnexpectedResponseError):
+        async for _ in get_measures_stream(
+            auth=CubeJSAuth(token="token", host="https://host"),
+            request=CubeJSRequest(measures=["orders.count"]),
+        ):
+            pass
+
+
+@pytest.mark.asyncio
+async def test_get_measures_stream_empty_data(httpx_mock):
+    # arrange
+    httpx_mock.add_response(
+        method="POST", url="https://host/cubejs-api/v1/load", json={"data": []}
+    )
+
+    # act
+    output = [
+        row
+        async for row in get_measures_stream(
+            auth=CubeJSAuth(token="token", host="https://host"),
+            request=CubeJSRequest(measures=["orders.count"]),
+        )
+    ]
+
+    # assert
+    assert output == []
+
+
+class ClosingStream(httpx.AsyncByteStream):
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+    async def aclose(self):
+        self.closed = True
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("use_client", [False, True])
+async def test_get_measures_stream_closed_early(httpx_mock, use_client):
+    # arrange
+    rows = [{"orders.count": i} for i in range(100)]
+    body = json.dumps({"data": rows}).encode()
+    stream = ClosingStream([body[i : i + 100] for i in range(0, len(body), 100)])
+    httpx_mock.add_response(
+        method="POST", url="https://host/cubejs-api/v1/load", stream=stream
+    )
+    auth = CubeJSAuth(token="token", host="https://host")
+    request = CubeJSRequest(measures=["orders.count"])
+    if use_client:
+        output = Client(auth=auth).get_measures_stream(request)
+    else:
+        output = get_measures_stream(auth=auth, request=request)
+
+    # act
+    first = await anext(output)
+    await output.aclose()
+
+    # assert
+    assert first == {"orders.count": 0}
+    assert stream.closed
+
+
+@pytest.mark.asyncio
+async def test_get_measures_stream_error(httpx_mock):
+    # arrange
+    httpx_mock.add_response(
+        method="POST",
+        url="https://host/cubejs-api/v1/load",
+        status_code=400,
+        text="invalid query",
+    )
+    client = Client(auth=CubeJSAuth(token="token", host="https://host"))
+
+    # act
+    with pytest.raises(errors.RequestError) as request_error:
+        async for _ in client.get_measures_stream(
+            CubeJSRequest(measures=["orders.count"])
+        ):
+            pass
+
+    # assert
+    assert str(request_error.value) == "CubeJS 400 request error: invalid query"
+
+
+@pytest.mark.asyncio
+async def test_client_max_attempts(httpx_mock):
+    # arrange
+    httpx_mock.add_response(
+        method="POST",
+        url="https://host/cubejs-api/v1/load",
+        content=b'{"error":"Continue wait"}',
+        headers={"Retry-After": "0"},
+        is_reusable=True,
+    )
+    client = Client(auth=CubeJSAuth(token="token", host="https://host"), max_attempts=2)
+
+    # act
+    with pytest.raises(tenacity.RetryError):
+        await client.get_measures(CubeJSRequest(measures=["orders.count"]))
+
+    # assert
+    assert len(httpx_mock.get_requests()) == 2
+
+
+@pytest.mark.asyncio
+async def test_get_measures_continue_wait_with_stage(httpx_mock):
+    # arrange
+    httpx_mock.add_response(
+        method="POST",
+        url="https://host/cubejs-api/v1/load",
+        json=CONTINUE_WAIT_WITH_STAGE,
+        headers={"Retry-After": "0"},
+    )
+    httpx_mock.add_response(
+        method="POST",
+        url="https://host/cubejs-api/v1/load",
+        json={"data": [{"orders.count": 42}]},
+    )
+
+    # act
+    output = await get_measures(
+        auth=CubeJSAuth(token="token", host="https://host"),
+        request=CubeJSRequest(measures=["orders.count"]),
+    )
+
+    # assert
+    assert output.data == [{"orders.count": 42}]
+    assert len(httpx_mock.get_requests()) == 2
+
+
+@pytest.mark.asyncio
+async def test_get_measures_retries_once_for_coalesced_requests(httpx_mock):
+    # arrange
+    httpx_mock.add_response(
+        method="POST",
+        url="https://host/cubejs-api/v1/load",
+        content=b'{"error":"Continue wait"}',
+        headers={"Retry-After": "0"},
+    )
+    httpx_mock.add_response(
+        method="POST",
+        url="https://host/cubejs-api/v1/load",
+        json={"data": [{"orders.count": 42}]},
+    )
+    auth = CubeJSAuth(token="token", host="https://host")
+    request = CubeJSRequest(measures=["orders.count"])
+
+    # act
+    responses = await asyncio.gather(
+        *(get_measures(auth=auth, request=request) for _ in range(3))
+    )
+
+    # assert
+    assert all(r.data == [{"orders.count": 42}] for r in responses)
+    assert len(httpx_mock.get_requests()) == 2
+
+
+@pytest.mark.asyncio
+async def test_warmup(httpx_mock):
+    # arrange
+    httpx_mock.add_response(method="GET", url="https://host/readyz", is_reusable=True)
+
+    # act
+    await warmup(auth=CubeJSAuth(token="token", host="https://host"), requests=3)
+
+    # assert
+    assert len(httpx_mock.get_requests()) == 3
+
+
+@pytest.mark.asyncio
+async def test_warmup_connection_error(httpx_mock):
+    # arrange
+    httpx_mock.add_exception(
+        httpx.ConnectError("connection refused"), url="https://host/readyz"
+    )
+    client = Client(auth=CubeJSAuth(token="token", host="https://host"))
+
+    # act
+    await client.warmup(requests=1)
+
+    # assert
+    assert len(httpx_mock.get_requests()) == 1
+
+
+def _monthly_orders(status):
+    return CubeJSRequest(
+        measures=["orders.count"],
+        time_dimensions=[
+            TimeDimension(
+                dimension="orders.created_at",
+                granularity=Granularity.MONTH,
+                date_range="last year",
+            )
+        ],
+        filters=[
+            Filter(
+                member="orders.status",
+                operator=FilterOperators.EQUALS,
+                values=[status],
+            )
+        ],
+    )
+
+
+@pytest.mark.asyncio
+async def test_batching_client(httpx_mock):
+    # arrange
+    httpx_mock.add_response(
+        method="POST",
+        url="https://host/cubejs-api/v1/load",
+        json={
+            "queryType": "blendingQuery",
+            "results": [
+                {"data": [{"orders.count": 42}]},
+                {"data": [{"orders.count": 13}]},
+                {"data": [{"orders.count": 35}]},
+            ],
+        },
+    )
+    client = BatchingClient(auth=CubeJSAuth(token="token", host="https://host"))
+
+    # act
+    responses = await asyncio.gather(
+        client.get_measures(_monthly_orders("completed")),
+        client.get_measures(_monthly_orders("processing")),
+        client.get_measures(_monthly_orders("shipped")),
+    )
+    await client.aclose()
+
+    # assert
+    assert [r.data for r in responses] == [
+        [{"orders.count": 42}],
+        [{"orders.count": 13}],
+        [{"orders.count": 35}],
+    ]
+    query = json.loads(httpx_mock.get_request().content)["query"]
+    assert [q["filters"][0]["values"] for q in query] == [
+        ["completed"],
+        ["processing"],
+        ["shipped"],
+    ]
+
+
+@pytest.mark.asyncio
+async def test_batching_client_without_granularity(httpx_mock):
+    # arrange
+    httpx_mock.add_response(
+        method="POST",
+        url="https://host/cubejs-api/v1/load",
+        json={"data": [{"orders.count": 42}]},
+        is_reusable=True,
+    )
+    client = BatchingClient(auth=CubeJSAuth(token="token", host="https://host"))
+
+    # act
+    responses = await asyncio.gather(
+        client.get_measures(CubeJSRequest(measures=["orders.count"])),
+        client.get_measures(CubeJSRequest(measures=["orders.count"])),
+    )
+    await client.aclose()
+
+    # assert
+    assert all(r.data == [{"orders.count": 42}] for r in responses)
+    requests = httpx_mock.get_requests()
+    assert len(requests) == 2
+    assert all(
+        json.loads(r.content)
+        == {"query": {"measures": ["orders.count"], "filters": []}}
+        for r in requests
+    )
+
+
+@pytest.mark.asyncio
+async def test_batching_client_error(httpx_mock):
+    # arrange
+    httpx_mock.add_response(
+        method="POST",
+        url="https://host/cubejs-api/v1/load",
+        status_code=400,
+        text="invalid query",
+        is_reusable=True,
+    )
+    client = BatchingClient(auth=CubeJSAuth(token="token", host="https://host"))
+
+    # act
+    results = await asyncio.gather(
+        client.get_measures(_monthly_orders("completed")),
+        client.get_measures(_monthly_orders("processing")),
+        return_exceptions=True,
+    )
+    await client.aclose()
+
+    # assert
+    assert all(isinstance(r, errors.RequestError) for r in results)
+    assert len(httpx_mock.get_requests()) == 3
+
+
+@pytest.mark.asyncio
+async def test_batching_client_error_is_kept_to_its_query(httpx_mock):
+    # arrange
+    def load(request):
+        query = json.loads(request.content)["query"]
+        if isinstance(query, list) or query["filters"][0]["values"] == ["invalid"]:
+            return httpx.Response(status_code=400, text="invalid query")
+        return httpx.Response(status_code=200, json={"data": [{"orders.count": 42}]})
+
+    httpx_mock.add_callback(
+        load, method="POST", url="https://host/cubejs-api/v1/load", is_reusable=True
+    )
+    client = BatchingClient(auth=CubeJSAuth(token="token", host="https://host"))
+
+    # act
+    valid, invalid = await asyncio.gather(
+        client.get_measures(_monthly_orders("completed")),
+        client.get_measures(_monthly_orders("invalid")),
+        return_exceptions=True,
+    )
+    await client.aclose()
+
+    # assert
+    assert valid.data == [{"orders.count": 42}]
+    assert isinstance(invalid, errors.RequestError)
+    assert len(httpx_mock.get_requests()) == 3
+
+
+@pytest.mark.asyncio
+async def test_batching_client_close_in_flight(httpx_mock):
+    # arrange
+    received = asyncio.Event()
+
+    async def load(request):
+        received.set()
+        await asyncio.sleep(10)
+
+    httpx_mock.add_callback(load, method="POST", url="https://host/cubejs-api/v1/load")
+    client = BatchingClient(auth=CubeJSAuth(token="token", host="https://host"))
+    callers = [
+        asyncio.create_task(client.get_measures(_monthly_orders(status)))
+        for status in ("completed", "processing")
+    ]
+    await received.wait()
+
+    # act
+    await client.aclose()
+    _, pending = await asyncio.wait(callers, timeout=2)
+
+    # assert
+    assert not pending
+    assert all(caller.cancelled() for caller in callers)
+
+
+@pytest.mark.asyncio
+async def test_batching_client_close_while_collecting():
+    # arrange
+    client = BatchingClient(
+        auth=CubeJSAuth(token="token", host="https://host"), max_delay_ms=10_000
+    )
+    callers = [
+        asyncio.create_task(client.get_measures(_monthly_orders(status)))
+        for status in ("completed", "processing")
+    ]
+    await asyncio.sleep(0.01)
+
+    # act
+    await client.aclose()
+    _, pending = await asyncio.wait(callers, timeout=2)
+
+    # assert
+    assert not pending
+    assert all(caller.cancelled() for caller in callers)
+
+
+def test_parse_response():
+    # act
+    output = _parse_response(
+        b'{"query": {}, "data": [{"orders.status": "completed", "orders.count": 42,'
+        b' "orders.total": 1.5, "orders.note": null}], "lastRefreshTime": "now"}'
+    )
+
+    # assert
+    assert output == CubeJSResponse(
+        data=[
+            {
+                "orders.status": "completed",
+                "orders.count": 42,
+                "orders.total": 1.5,
+                "orders.note": None,
+            }
+        ]
+    )
+
+
+def test_serialize():
+    # act
+    output = _serialize('{"measures":["orders.count"]}')
+
+    # assert
+    assert output == b'{"query":{"measures":["orders.count"]}}'
+
+
+@pytest.mark.asyncio
+async def test_shared_client_is_reused():
+    # act
+    first = _get_client()
+    second = _get_client()
+    await aclose()
+    third = _get_client()
+
+    # assert
+    assert first is second
+    assert first.is_closed
+    assert third is not first
+
+
+def test_get_measures_in_successive_event_loops():
+    # arrange
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            body = b'{"data": [{"orders.count": 42}]}'
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    auth = CubeJSAuth(token="token", host=f"http://127.0.0.1:{server.server_port}")
+    request = CubeJSRequest(measures=["orders.count"])
+
+    # act
+    try:
+        outputs = [
+            asyncio.run(get_measures(auth=auth, request=request, bypass_cache=True))
+            for _ in range(2)
+        ]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # assert
+    assert all(output.data == [{"orders.count": 42}] for output in outputs)
+
+
+def test_concurrent_get_measures_in_successive_event_loops(httpx_mock):
+    # arrange
+    async def load(request):
+        await asyncio.sleep(0.01)
+        return httpx.Response(status_code=200, json={"data": []})
+
+    httpx_mock.add_callback(
+        load, method="POST", url="https://host/cubejs-api/v1/load", is_reusable=True
+    )
+    auth = CubeJSAuth(token="token", host="https://host")
+
+    async def load_many():
+        return await asyncio.gather(
+            *(
+                get_measures(auth, CubeJSRequest(measures=[f"orders.count_{i}"]))
+                for i in range(12)
+            )
+        )
+
+    # act
+    asyncio.run(load_many())
+    clear_cache()
+    asyncio.run(load_many())
+
+    # assert
+    assert len(httpx_mock.get_requests()) == 24
+
+
 def test_error_handler():
     # act
     with pytest.raises(errors.AuthorizationError) as auth_error:
@@ -97,10 +912,13 @@ def test_error_handler():
         _error_handler(Mock(status_code=400, text=""))
 
     with pytest.raises(errors.ContinueWaitError) as continue_wait_error:
-        _error_handler(Mock(status_code=200, text="Continue wait"))
+        _error_handler(httpx.Response(200, content=b'{"error":"Continue wait"}'))
+
+    with pytest.raises(errors.ContinueWaitError):
+        _error_handler(httpx.Response(200, json=CONTINUE_WAIT_WITH_STAGE))
 
     with pytest.raises(errors.BadGatewayError) as bad_gateway_error:
-        _error_handler(Mock(status_code=502, text="Bad Gateway"))
+        _error_handler(httpx.Response(502, text="Bad Gateway"))
 
     with pytest.raises(errors.ServerError) as server_error:
         _error_handler(Mock(status_code=500, text=""))
@@ -118,3 +936,68 @@ def test_error_handler():
     assert str(server_error.value) == "CubeJS server error: "
     assert str(unexpected_response_error.value) == "CubeJS unexpected response: "
     assert "attempting a retry" in str(bad_gateway_error.value)
+
+
+def test_error_handler_success():
+    # arrange
+    data = [{"orders.status": "Continue wait"} for _ in range(10)]
+
+    # act
+    _error_handler(httpx.Response(200, json={"data": data}))
+    _error_handler(httpx.Response(200, json={"data": []}))
+
+
+def test_error_handler_retry_after():
+    # act
+    with pytest.raises(errors.BadGatewayError) as seconds:
+        _error_handler(httpx.Response(502, headers={"Retry-After": "3"}))
+
+    with pytest.raises(errors.BadGatewayError) as http_date:
+        _error_handler(
+            httpx.Response(
+                502, headers={"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}
+            )
+        )
+
+    with pytest.raises(errors.BadGatewayError) as naive_http_date:
+        retry_at = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(
+            seconds=60
+        )
+        _error_handler(
+            httpx.Response(
+                502, headers={"Retry-After": email.utils.format_datetime(retry_at)}
+            )
+        )
+
+    with pytest.raises(errors.BadGatewayError) as invalid:
+        _error_handler(httpx.Response(502, headers={"Retry-After": "soon"}))
+
+    with pytest.raises(errors.BadGatewayError) as missing:
+        _error_handler(httpx.Response(502))
+
+    # assert
+    assert seconds.value.retry_after == 3
+    assert http_date.value.retry_after == 0
+    assert 0 < naive_http_date.value.retry_after <= 60
+    assert invalid.value.retry_after is None
+    assert missing.value.retry_after is None
+
+
+@pytest.mark.parametrize(
+    "exc, minimum, maximum",
+    [
+        (errors.BadGatewayError(retry_after=3), 3, 3),
+        (errors.BadGatewayError(retry_after=600), 30, 30),
+        (errors.ContinueWaitError(), 0, 31),
+    ],
+)
+def test_wait(exc, minimum, maximum):
+    # arrange
+    retry_state = tenacity.RetryCallState(None, None, (), {})
+    retry_state.set_exception((type(exc), exc, None))
+
+    # act
+    wait = _wait(retry_state)
+
+    # assert
+    assert minimum <= wait <= maximum
@@ -1,9 +1,12 @@
 """Tests for the CubeJS data model."""
 
+import re
+
 import pytest
 from pydantic import ValidationError
 
 from cubejs import (
+    CubeJSAuth,
     CubeJSRequest,
     Filter,
     FilterOperators,
@@ -13,134 +16,183 @@ from cubejs import (
     TimeDimension,
 )
 
+EQ, NE, CONTAINS, GT, LT, IN_RANGE, SET = (
+    FilterOperators.EQUALS,
+    FilterOperators.NOT_EQUALS,
+    FilterOperators.CONTAINS,
+    FilterOperators.GREATER_THAN,
+    FilterOperators.LESS_THAN,
+    FilterOperators.IN_DATE_RANGE,
+    FilterOperators.SET,
+)
+MONTH, DAY = Granularity.MONTH, Granularity.DAY
+DESC = OrderBy.DESC
+
+YEAR_2023, YEAR_2022 = ["2023-01-01", "2023-12-31"], ["2022-01-01", "2022-12-31"]
+Q1_2023, Q1_2022 = ["2023-01-01", "2023-03-31"], ["2022-01-01", "2022-03-31"]
+
+BOTH_RANGES_RE = re.compile("Cannot provide both date_range and compare_date_range")
+WRONG_LENGTH_RE = re.compile(
+    "Each compare_date_range entry must contain exactly 2 dates"
+)
+EMPTY_REQUEST_RE = re.compile("Query should contain either measures, dimensions")
+
+REQUEST_ALIASES = frozenset({"timeDimensions"})
+TIME_DIMENSION_ALIASES = frozenset({"dateRange", "compareDateRange"})
+
+COMPLETED_FILTER = Filter(member="orders.status", operator=EQ, values=["completed"])
+LARGE_ORDER_FILTER = LogicalOperator(
+    or_=[
+        Filter(member="orders.total_amount", operator=GT, values=["100"]),
+        Filter(member="orders.items_count", operator=GT, values=["5"]),
+    ]
+)
+NESTED_OPERATOR = LogicalOperator.model_construct(
+    or_=[
+        Filter(member="products.category", operator=EQ, values=["Electronics"]),
+        LogicalOperator.model_construct(
+            and_=[
+                Filter(member="products.price", operator=GT, values=["100"]),
+                Filter(member="products.in_stock", operator=EQ, values=["true"]),
+            ]
+        ),
+    ]
+)
+
+
+@pytest.fixture(scope="module")
+def valid_time_dim():
+    """Monthly time dimension over 2023, shared as models are immutable."""
+    return TimeDimension(
+        dimension="orders.created_at",
+        granularity=MONTH,
+        date_range=YEAR_2023,
+    )
+
+
+@pytest.fixture(scope="session")
+def serialized_request():
+    """Monthly request dumped once with aliases, for serialization checks."""
+    return CubeJSRequest(
+        measures=["orders.count"],
+        time_dimensions=[
+            TimeDimension(
+                dimension="orders.created_at",
+                granularity=MONTH,
+                date_range=YEAR_2023,
+            )
+        ],
+    ).model_dump(by_alias=True)
+
 
 class TestTimeDimension:
     """Test suite for TimeDimension model."""
 
-    def test_valid_time_dimension(self):
+    def test_valid_time_dimension(self, valid_time_dim):
         """Test creating a valid time dimension."""
-        time_dim = TimeDimension(
-            dimension="orders.created_at",
-            granularity=Granularity.MONTH,
-            date_range=["2023-01-01", "2023-12-31"],
-        )
+        time_dim = valid_time_dim
         assert time_dim.dimension == "orders.created_at"
-        assert time_dim.granularity == Granularity.MONTH
-        assert time_dim.date_range == ["2023-01-01", "2023-12-31"]
-        assert time_dim.compare_date_range is None
+        assert time_dim.granularity == MONTH
+        assert time_dim.date_range == YEAR_2023
 
-    def test_time_dimension_with_relative_date(self):
-        """Test time dimension with relative date string."""
+    @pytest.mark.parametrize(
+        "granularity,date_range,compare_date_range",
+        [
+            (DAY, "last week", None),
+            (
+                MONTH,
+                None,
+                [Q1_2023, Q1_2022],
+            ),
+            (MONTH, None, [Q1_2023, "last quarter"]),
+        ],
+        ids=["relative_date", "compare_date_range", "mixed_compare_date_range"],
+    )
+    def test_time_dimension_variants(self, granularity, date_range, compare_date_range):
+        """Test time dimensions with relative and compared date ranges."""
         time_dim = TimeDimension(
             dimension="orders.created_at",
-            granularity=Granularity.DAY,
-            date_range="last week",
+            granularity=granularity,
+            date_range=date_range,
+            compare_date_range=compare_date_range,
         )
-        assert time_dim.date_range == "last week"
+        assert time_dim.granularity == granularity
+        assert time_dim.date_range == date_range
+        assert time_dim.compare_date_range == compare_date_range
 
-    def test_time_dimension_with_compare_date_range(self):
-        """Test time dimension with compare date range."""
-        time_dim = TimeDimension(
-            dimension="orders.created_at",
-            granularity=Granularity.MONTH,
-            compare_date_range=[
-                ["2023-01-01", "2023-03-31"],
-                ["2022-01-01", "2022-03-31"],
-            ],
-        )
-        assert time_dim.compare_date_range == [
-            ["2023-01-01", "2023-03-31"],
-            ["2022-01-01", "2022-03-31"],
-        ]
-        assert time_dim.date_range is None
+    @pytest.mark.parametrize(
+        "field", ["granularity", "date_range", "compare_date_range"]
+    )
+    def test_default_none(self, field):
+        """Test that optional time dimension fields default to None."""
+        assert getattr(TimeDimension(dimension="orders.created_at"), field) is None
 
-    def test_time_dimension_with_mixed_compare_date_range(self):
-        """Test time dimension with mixed format compare date range."""
-        time_dim = TimeDimension(
-            dimension="orders.created_at",
-            granularity=Granularity.MONTH,
-            compare_date_range=[["2023-01-01", "2023-03-31"], "last quarter"],
-        )
-        assert time_dim.compare_date_range == [
-            ["2023-01-01", "2023-03-31"],
-            "last quarter",
-        ]
+    def test_time_dimension_with_raw_granularity(self):
+        """Test that granularity can be passed as a raw string."""
+        time_dim = TimeDimension(dimension="orders.created_at", granularity="month")
+        assert time_dim.granularity is MONTH
 
     def test_invalid_both_date_ranges(self):
         """Test that providing both date_range and compare_date_range is an error."""
-        with pytest.raises(ValidationError) as exc_info:
+        with pytest.raises(ValidationError, match=BOTH_RANGES_RE):
             TimeDimension(
                 dimension="orders.created_at",
-                date_range=["2023-01-01", "2023-12-31"],
-                compare_date_range=[["2022-01-01", "2022-12-31"]],
+                date_range=YEAR_2023,
+                compare_date_range=[YEAR_2022],
             )
-        assert "Cannot provide both date_range and compare_date_range" in str(
-            exc_info.value
-        )
 
     def test_invalid_compare_date_range_length(self):
         """Test that compare_date_range entries must have exactly 2 dates when lists."""
-        with pytest.raises(ValidationError) as exc_info:
+        with pytest.raises(ValidationError, match=WRONG_LENGTH_RE):
             TimeDimension(
                 dimension="orders.created_at",
                 compare_date_range=[["2023-01-01", "2023-03-31", "2023-06-30"]],
             )
-        assert "Each compare_date_range entry must contain exactly 2 dates" in str(
-            exc_info.value
-        )
-
 
-class TestFilter:
-    """Test suite for Filter model."""
+    def test_invalid_unknown_field(self):
+        """Test that misspelled fields are an error instead of being ignored."""
+        with pytest.raises(ValidationError):
+            TimeDimension(dimension="orders.created_at", date_ranges="last week")
 
-    def test_equals_filter(self):
-        """Test creating an equals filter."""
-        filter_obj = Filter(
-            member="products.category",
-            operator=FilterOperators.EQUALS,
-            values=["Electronics"],
-        )
-        assert filter_obj.member == "products.category"
-        assert filter_obj.operator == "equals"
-        assert filter_obj.values == ["Electronics"]
+    def test_frozen(self):
+        """Test that a time dimension can't be changed once validated."""
+        time_dim = TimeDimension(dimension="orders.created_at", date_range="last week")
+        with pytest.raises(ValidationError):
+            time_dim.date_range = "last month"
 
-    def test_not_equals_filter(self):
-        """Test creating a not equals filter."""
-        filter_obj = Filter(
-            member="products.category",
-            operator=FilterOperators.NOT_EQUALS,
-            values=["Clothing"],
-        )
-        assert filter_obj.operator == "notEquals"
-        assert filter_obj.values == ["Clothing"]
 
-    def test_contains_filter(self):
-        """Test creating a contains filter."""
-        filter_obj = Filter(
-            member="products.name",
-            operator=FilterOperators.CONTAINS,
-            values=["iPhone"],
-        )
-        assert filter_obj.operator == "contains"
+class TestFilter:
+    """Test suite for Filter model."""
 
-    def test_in_date_range_filter(self):
-        """Test creating an in date range filter."""
-        filter_obj = Filter(
-            member="orders.created_at",
-            operator=FilterOperators.IN_DATE_RANGE,
-            values=["2023-01-01", "2023-12-31"],
-        )
-        assert filter_obj.operator == "inDateRange"
-        assert filter_obj.values == ["2023-01-01", "2023-12-31"]
+    @pytest.mark.parametrize(
+        "member,operator,values,expected",
+        [
+            ("products.category", EQ, ["Electronics"], "equals"),
+            ("products.category", NE, ["Clothing"], "notEquals"),
+            ("products.name", CONTAINS, ["iPhone"], "contains"),
+            (
+                "orders.created_at",
+                IN_RANGE,
+                YEAR_2023,
+                "inDateRange",
+            ),
+            ("products.description", SET, None, "set"),
+        ],
+        ids=["equals", "not_equals", "contains", "in_date_range", "set_without_values"],
+    )
+    def test_filter_variants(self, member, operator, values, expected):
+        """Test creating filters for each kind of operator."""
+        filter_obj = Filter(member=member, operator=operator, values=values)
+        assert filter_obj.member == member
+        assert filter_obj.operator == expected
+        assert filter_obj.values == values
 
-    def test_set_filter_without_values(self):
-        """Test creating a set filter without values."""
+    def test_filter_with_raw_operator(self):
+        """Test that the operator can be passed as a raw string."""
         filter_obj = Filter(
-            member="products.description",
-            operator=FilterOperators.SET,
+            member="products.category", operator="equals", values=["Electronics"]
         )
-        assert filter_obj.operator == "set"
-        assert filter_obj.values is None
+        assert filter_obj.operator == EQ
 
 
 class TestLogicalOperator:
@@ -148,40 +200,22 @@ class TestLogicalOperator:
 
     def test_or_operator(self):
         """Test creating an OR logical operator."""
-        logical_op = LogicalOperator(
-            or_=[
-                Filter(
-                    member="products.category",
-                    operator=FilterOperators.EQUALS,
-                    values=["Electronics"],
-                ),
-                Filter(
-                    member="products.category",
-                    operator=FilterOperators.EQUALS,
-                    values=["Computers"],
-                ),
-            ]
-        )
-        assert len(logical_op.or_) == 2
+        filters = [
+            Filter(member="products.category", operator=EQ, values=["Electronics"]),
+            Filter(member="products.category", operator=EQ, values=["Computers"]),
+        ]
+        logical_op = LogicalOperator(or_=filters)
+        assert logical_op.or_ == filters
         assert logical_op.and_ is None
 
     def test_and_operator(self):
         """Test creating an AND logical operator."""
-        logical_op = LogicalOperator(
-            and_=[
-                Filter(
-                    member="products.price",
-                    operator=FilterOperators.GREATER_THAN,
-                    values=["100"],
-                ),
-                Filter(
-                    member="products.price",
-                    operator=FilterOperators.LESS_THAN,
-                    values=["500"],
-                ),
-            ]
-        )
-        assert len(logical_op.and_) == 2
+        filters = [
+            Filter(member="products.price", operator=GT, values=["100"]),
+            Filter(member="products.price", operator=LT, values=["500"]),
+        ]
+        logical_op = LogicalOperator(and_=filters)
+        assert logical_op.and_ == filters
         assert logical_op.or_ is None
 
     def test_nested_logical_operators(self):
@@ -190,28 +224,26 @@ class TestLogicalOperator:
             or_=[
                 Filter(
                     member="products.category",
-                    operator=FilterOperators.EQUALS,
+                    operator=EQ,
                     values=["Electronics"],
                 ),
                 LogicalOperator(
                     and_=[
                         Filter(
                             member="products.price",
-                            operator=FilterOperators.GREATER_THAN,
+                            operator=GT,
                             values=["100"],
                         ),
                         Filter(
                             member="products.in_stock",
-                            operator=FilterOperators.EQUALS,
+                            operator=EQ,
                             values=["true"],
                         ),
                     ]
                 ),
             ]
         )
-        assert len(logical_op.or_) == 2
-        assert isinstance(logical_op.or_[1], LogicalOperator)
-        assert len(logical_op.or_[1].and_) == 2
+        assert logical_op == NESTED_OPERATOR
 
 
 class TestCubeJSRequest:
@@ -225,65 +257,71 @@ class TestCubeJSRequest:
         assert request.filters == []
         assert request.time_dimensions is None
 
-    def test_complete_request(self):
+    def test_complete_request(self, valid_time_dim):
         """Test creating a complete request with all fields."""
         request = CubeJSRequest(
             measures=["orders.count", "orders.total_amount"],
             dimensions=["customers.city", "customers.state"],
-            time_dimensions=[
-                TimeDimension(
-                    dimension="orders.created_at",
-                    granularity=Granularity.MONTH,
-                    date_range=["2023-01-01", "2023-12-31"],
-                )
-            ],
-            filters=[
-                Filter(
-                    member="orders.status",
-                    operator=FilterOperators.EQUALS,
-                    values=["completed"],
-                ),
-                LogicalOperator(
-                    or_=[
-                        Filter(
-                            member="orders.total_amount",
-                            operator=FilterOperators.GREATER_THAN,
-                            values=["100"],
-                        ),
-                        Filter(
-                            member="orders.items_count",
-                            operator=FilterOperators.GREATER_THAN,
-                            values=["5"],
-                        ),
-                    ]
-                ),
-            ],
-            order={"orders.total_amount": OrderBy.DESC},
+            time_dimensions=[valid_time_dim],
+            filters=[COMPLETED_FILTER, LARGE_ORDER_FILTER],
+            order={"orders.total_amount": DESC},
             limit=100,
             offset=0,
         )
 
-        assert len(request.measures) == 2
-        assert len(request.dimensions) == 2
-        assert len(request.time_dimensions) == 1
-        assert len(request.filters) == 2
-        assert request.order == {"orders.total_amount": OrderBy.DESC}
+        assert request.measures == ["orders.count", "orders.total_amount"]
+        assert request.dimensions == ["customers.city", "customers.state"]
+        assert request.time_dimensions == [valid_time_dim]
+        assert request.filters == [COMPLETED_FILTER, LARGE_ORDER_FILTER]
+        assert request.order == {"orders.total_amount": DESC}
         assert request.limit == 100
         assert request.offset == 0
 
-    def test_request_serialization(self):
-        """Test that the request serializes correctly with proper field names."""
+    def test_request_without_measures(self):
+        """Test requests with dimensions or time granularity but no measures."""
+        assert CubeJSRequest(dimensions=["customers.city"]).measures == []
         request = CubeJSRequest(
-            measures=["orders.count"],
             time_dimensions=[
-                TimeDimension(
-                    dimension="orders.created_at",
-                    granularity=Granularity.MONTH,
-                    date_range=["2023-01-01", "2023-12-31"],
-                )
-            ],
+                TimeDimension(dimension="orders.created_at", granularity=DAY)
+            ]
         )
+        assert request.measures == []
+
+    def test_invalid_empty_request(self):
+        """Test that a request asking for nothing is an error."""
+        with pytest.raises(ValidationError, match=EMPTY_REQUEST_RE):
+            CubeJSRequest(
+                segments=["orders.completed"],
+                time_dimensions=[
+                    TimeDimension(dimension="orders.created_at", date_range="last week")
+                ],
+            )
+
+    def test_request_serialization(self, serialized_request):
+        """Test that the request serializes correctly with proper field names."""
+        assert REQUEST_ALIASES <= serialized_request.keys()
+        assert TIME_DIMENSION_ALIASES <= serialized_request["timeDimensions"][0].keys()
+
+
+class TestCubeJSAuth:
+    """Test suite for CubeJSAuth model."""
+
+    def test_request_settings(self):
+        """Test the url and headers used to request cubejs."""
+        auth = CubeJSAuth(token="token", host="https://host")
+        assert auth.load_url == "https://host/cubejs-api/v1/load"
+        assert auth.auth_headers == {"Authorization": "token"}
+
+    def test_request_settings_of_copy(self):
+        """Test that a copy with another token and host requests with its own."""
+        auth = CubeJSAuth(token="tenant-a", host="https://host-a")
+        assert auth.auth_headers == {"Authorization": "tenant-a"}
+        copy = auth.model_copy(update={"token": "tenant-b", "host": "https://host-b"})
+        assert copy.load_url == "https://host-b/cubejs-api/v1/load"
+        assert copy.auth_headers == {"Authorization": "tenant-b"}
 
-        serialized = request.model_dump(by_alias=True)
-        assert "timeDimensions" in serialized
-        assert "dateRange" in serialized["timeDimensions"][0]
+    def test_frozen(self):
+        """Test that the token can't change between caching and sending a request."""
+        auth = CubeJSAuth(token="token", host="https://host")
+        with pytest.raises(ValidationError):
+            auth.token = "other-token"